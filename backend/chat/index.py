@@ -1,8 +1,101 @@
+import hashlib
 import json
+import math
 import re
 import os
+import heapq
+import orjson
 import requests
-from typing import Dict, Any, List
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Callable, Dict, Any, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# Предложение без окружающих пробелов: split, strip и отброс пустых за один проход
+_SENTENCE_RE = re.compile(r'[^.!?\s](?:[^.!?]*[^.!?\s])?')
+# Максимальный отрезок \w уже ограничен границами слова, якоря \b не нужны
+_WORD_RE = re.compile(r'\w+')
+# Для ASCII-документов те же слова, но без проверки юникодных классов символов
+_ASCII_WORD_RE = re.compile(r'\w+', re.ASCII)
+
+# Служебные слова (ru + en), которые не участвуют в ранжировании
+_STOPWORDS = frozenset({
+    'а', 'без', 'бы', 'был', 'была', 'были', 'было', 'быть', 'в', 'вам', 'вас', 'во', 'вот',
+    'все', 'всё', 'вы', 'где', 'да', 'для', 'до', 'его', 'ее', 'её', 'если', 'есть', 'еще',
+    'ещё', 'же', 'за', 'и', 'из', 'или', 'им', 'их', 'к', 'как', 'какая', 'какие', 'каким',
+    'какой', 'когда', 'кто', 'ли', 'мне', 'мы', 'на', 'над', 'не', 'нет', 'ни', 'но', 'о',
+    'об', 'он', 'она', 'они', 'оно', 'от', 'по', 'под', 'при', 'про', 'с', 'со', 'так',
+    'также', 'такое', 'там', 'то', 'тоже', 'только', 'у', 'уже', 'чем', 'что', 'чтобы',
+    'это', 'этот', 'эта', 'эти', 'я',
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'do', 'does', 'for', 'from', 'how',
+    'in', 'is', 'it', 'of', 'on', 'or', 'the', 'this', 'that', 'to', 'was', 'what', 'when',
+    'where', 'which', 'who', 'why', 'with',
+})
+
+# Параметры BM25: насыщение частоты термина и нормализация по длине чанка
+_BM25_K1 = 1.2
+_BM25_B = 0.65
+
+# Общая HTTP-сессия: keep-alive соединение с OpenAI переживает тёплые вызовы функции.
+# Короткие повторы на 429/5xx; после них возвращается последний ответ, чтобы
+# call_openai_api сам разобрал код ошибки
+_RETRY = Retry(
+    total=2,
+    # Таймаут чтения не повторяем и пробрасываем как есть (ReadTimeout), чтобы
+    # call_openai_api вернул сообщение о таймауте. Повторы по 502/504 после
+    # медленного ответа все равно могут занять до трех попыток по 30 секунд
+    read=False,
+    backoff_factor=0.3,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=frozenset({'POST'}),
+    respect_retry_after_header=False,
+    raise_on_status=False
+)
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=_RETRY))
+
+# Ключ OpenAI читается один раз при загрузке модуля и закрепляется за сессией
+_OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+if _OPENAI_API_KEY:
+    _SESSION.headers['Authorization'] = f'Bearer {_OPENAI_API_KEY}'
+
+# Префиксы сообщений call_openai_api об ошибке (такие ответы не кэшируются)
+_OPENAI_ERROR_PREFIXES = ('Ошибка', 'Таймаут', 'Неожиданная ошибка')
+
+# LRU-кэш ответов по (хэш документа, вопрос) в пределах тёплого контейнера
+_ANSWER_CACHE: 'OrderedDict[Tuple[str, str], Dict[str, Any]]' = OrderedDict()
+_ANSWER_CACHE_SIZE = 512
+
+# LRU-кэш индексов документов: чанки и токены не пересчитываются для каждого вопроса
+# Индекс занимает в памяти примерно в 25 раз больше исходного текста, поэтому
+# кэш ограничен суммарной длиной документов, а не только числом записей
+_INDEX_CACHE: 'OrderedDict[Tuple[str, int], DocumentIndex]' = OrderedDict()
+_INDEX_CACHE_SIZE = 8
+_INDEX_CACHE_BUDGET = 2_000_000  # символов текста во всех закэшированных документах
+
+# Максимальная длина текста чанка в ответе клиенту (в промпт идет полный текст)
+_CHUNK_TEXT_LIMIT = 512
+
+# Неизменный системный промпт идет первым сообщением: одинаковый префикс
+# запросов попадает в серверный кэш промптов OpenAI
+_SYSTEM_PROMPT = """Ты - помощник по анализу документов. Твоя задача - отвечать на вопросы пользователя на основе предоставленных фрагментов документа.
+
+Правила:
+1. Отвечай только на основе предоставленной информации
+2. Если информации недостаточно, так и скажи
+3. Структурируй ответ с нумерацией пунктов если возможно
+4. Указывай на какие фрагменты ты ссылаешься
+5. Отвечай на русском языке"""
+
+_USER_PROMPT_TEMPLATE = """Вопрос пользователя: {query}
+
+Доступные фрагменты документа:
+{context}
+
+Пожалуйста, ответь на вопрос на основе этих фрагментов."""
+
+_FRAGMENT_TEMPLATE = "Фрагмент {number} (релевантность: {relevance:.2f}):\n{text}"
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
@@ -30,12 +123,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 405,
             'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
+            'body': orjson.dumps({'error': 'Method not allowed'}).decode()
         }
     
     try:
         # Парсим входные данные
-        body_data = json.loads(event.get('body', '{}'))
+        body_data = parse_json(event.get('body') or '{}')
         query = body_data.get('query', '').strip()
         document = body_data.get('document', '').strip()
         
@@ -43,63 +136,75 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 400,
                 'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Query is required'})
+                'body': orjson.dumps({'error': 'Query is required'}).decode()
             }
         
         if not document:
             return {
                 'statusCode': 400,
                 'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Document is required'})
+                'body': orjson.dumps({'error': 'Document is required'}).decode()
             }
         
-        # Инициализируем OpenAI клиент
-        openai_api_key = os.environ.get('OPENAI_API_KEY')
-        if not openai_api_key:
+        # Проверяем, что OpenAI клиент настроен
+        if not _OPENAI_API_KEY:
             return {
                 'statusCode': 500,
                 'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'OpenAI API key not configured'})
+                'body': orjson.dumps({'error': 'OpenAI API key not configured'}).decode()
+            }
+        
+        # Повторный вопрос по тому же документу отдаем из кэша
+        doc_hash = document_hash(document)
+        cache_key = (doc_hash, query)
+        result = cache_get(_ANSWER_CACHE, cache_key)
+        if result is not None:
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': dump_json(result)
             }
         
         # Выполняем RAG поиск
-        relevant_chunks = perform_rag_search(query, document)
+        relevant_chunks, chunks_found = perform_rag_search(query, document, doc_hash=doc_hash)
         
         # Создаем контекст для OpenAI
-        context_text = "\n\n".join([f"Фрагмент {i+1} (релевантность: {chunk['relevance']:.2f}):\n{chunk['text']}" 
-                                   for i, chunk in enumerate(relevant_chunks)])
+        context_text = "\n\n".join(
+            _FRAGMENT_TEMPLATE.format(number=i, relevance=chunk['relevance'], text=chunk['text'])
+            for i, chunk in enumerate(relevant_chunks, 1)
+        )
         
         # Формируем промпт для OpenAI
-        system_prompt = """Ты - помощник по анализу документов. Твоя задача - отвечать на вопросы пользователя на основе предоставленных фрагментов документа.
-
-Правила:
-1. Отвечай только на основе предоставленной информации
-2. Если информации недостаточно, так и скажи
-3. Структурируй ответ с нумерацией пунктов если возможно
-4. Указывай на какие фрагменты ты ссылаешься
-5. Отвечай на русском языке"""
-
-        user_prompt = f"""Вопрос пользователя: {query}
-
-Доступные фрагменты документа:
-{context_text}
-
-Пожалуйста, ответь на вопрос на основе этих фрагментов."""
+        user_prompt = _USER_PROMPT_TEMPLATE.format(query=query, context=context_text)
         
         # Запрос к OpenAI через HTTP API
-        answer = call_openai_api(openai_api_key, system_prompt, user_prompt)
+        answer = call_openai_api(_SYSTEM_PROMPT, user_prompt)
         
         # Если OpenAI вернул ошибку, используем fallback
-        if answer.startswith("Ошибка"):
-            answer = generate_fallback_answer(relevant_chunks, query)
+        openai_failed = answer.startswith(_OPENAI_ERROR_PREFIXES)
+        if openai_failed:
+            answer = generate_fallback_answer(relevant_chunks, query, chunks_found)
         
         # Возвращаем результат
         result = {
             'answer': answer,
-            'relevant_chunks': relevant_chunks[:5],  # Топ-5 чанков
+            'relevant_chunks': [  # Топ-5 чанков в компактном виде
+                {
+                    'text': chunk['text'][:_CHUNK_TEXT_LIMIT],
+                    'relevance': round(chunk['relevance'], 3),
+                    'chunk_id': chunk['chunk_id'],
+                    'length': chunk['length']
+                }
+                for chunk in relevant_chunks
+            ],
             'query': query,
-            'chunks_found': len(relevant_chunks)
+            'chunks_found': chunks_found
         }
+        if not openai_failed:
+            cache_put(_ANSWER_CACHE, cache_key, result, _ANSWER_CACHE_SIZE)
         
         return {
             'statusCode': 200,
@@ -107,14 +212,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps(result, ensure_ascii=False)
+            'body': dump_json(result)
         }
         
     except json.JSONDecodeError:
         return {
             'statusCode': 400,
             'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Invalid JSON in request body'})
+            'body': orjson.dumps({'error': 'Invalid JSON in request body'}).decode()
         }
     except Exception as e:
         print(f"Detailed error in handler: {str(e)}")
@@ -123,38 +228,223 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 500,
             'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': f'Internal server error: {str(e)}'})
+            'body': dump_json({'error': f'Internal server error: {str(e)}'})
         }
 
 
-def perform_rag_search(query: str, document: str, chunk_size: int = 200) -> List[Dict[str, Any]]:
+def parse_json(raw: str) -> Any:
+    """
+    Разбирает JSON через orjson; строки с одиночными суррогатами (\\ud800 из
+    обрезанных эмодзи) orjson отвергает, их разбирает стандартный json
+    """
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return json.loads(raw)
+
+
+def dump_json(value: Any) -> str:
+    """
+    Сериализует ответ через orjson, а при одиночных суррогатах в строках -
+    стандартным json с экранированием
+    """
+    try:
+        return orjson.dumps(value).decode()
+    except orjson.JSONEncodeError:
+        return json.dumps(value)
+
+
+def document_hash(document: str) -> str:
+    """
+    Возвращает короткий хэш содержимого документа для ключей кэша
+    """
+    return hashlib.blake2b(document.encode('utf-8', errors='surrogatepass'), digest_size=16).hexdigest()
+
+
+def cache_get(cache: OrderedDict, key: Any) -> Any:
+    """
+    Достает значение из LRU-кэша и помечает его как недавно использованное
+    """
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def cache_put(cache: OrderedDict, key: Any, value: Any, max_size: int,
+              size_of: Optional[Callable[[Any], int]] = None, budget: int = 0) -> None:
+    """
+    Кладет значение в LRU-кэш, вытесняя самые старые записи
+    сверх max_size, а при заданном size_of - и сверх суммарного budget
+    """
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_size:
+        cache.popitem(last=False)
+    if size_of is not None:
+        total = sum(size_of(item) for item in cache.values())
+        while total > budget and len(cache) > 1:
+            _, evicted = cache.popitem(last=False)
+            total -= size_of(evicted)
+
+
+@dataclass
+class DocumentIndex:
+    """
+    Предвычисленные для документа чанки и статистики BM25
+    """
+    # Длина исходного документа в символах, для бюджета кэша
+    text_length: int
+    chunks: List[str]
+    chunks_lower: List[str]
+    chunk_tfs: List[Counter]
+    # Нормировка BM25 по длине: k1 * (1 - b + b * dl / avgdl) для каждого чанка
+    chunk_norms: List[float]
+    # Инвертированный индекс: слово -> номера чанков, где оно встречается
+    postings: Dict[str, List[int]]
+    # Длинные значимые слова словаря, среди которых ищутся словоформы запроса
+    long_terms: List[str]
+
+
+def build_document_index(document: str, chunk_size: int = 200) -> DocumentIndex:
     """
-    Выполняет RAG поиск по документу
+    Разбивает документ на чанки и один раз токенизирует их
     """
-    # Разбиваем документ на чанки
     chunks = create_chunks(document, chunk_size)
     
-    # Вычисляем релевантность каждого чанка
-    scored_chunks = []
+    # Приводим к нижнему регистру и токенизируем чанки один раз
+    word_re = _ASCII_WORD_RE if document.isascii() else _WORD_RE
+    chunks_lower = [chunk.lower() for chunk in chunks]
+    chunk_tfs = [Counter(word_re.findall(chunk_lower)) for chunk_lower in chunks_lower]
+    chunk_lengths = [sum(tf.values()) for tf in chunk_tfs]
+    avg_length = (sum(chunk_lengths) / len(chunks) if chunks else 0.0) or 1.0
+    chunk_norms = [
+        _BM25_K1 * (1 - _BM25_B + _BM25_B * length / avg_length)
+        for length in chunk_lengths
+    ]
+    postings: Dict[str, List[int]] = defaultdict(list)
+    for i, tf in enumerate(chunk_tfs):
+        for word in tf:
+            postings[word].append(i)
+    
+    return DocumentIndex(
+        text_length=len(document),
+        chunks=chunks,
+        chunks_lower=chunks_lower,
+        chunk_tfs=chunk_tfs,
+        chunk_norms=chunk_norms,
+        postings=dict(postings),
+        long_terms=[term for term in postings if len(term) >= 4 and term not in _STOPWORDS]
+    )
+
+
+def get_document_index(document: str, chunk_size: int = 200,
+                       doc_hash: Optional[str] = None) -> DocumentIndex:
+    """
+    Возвращает индекс документа из кэша, строя его при первом обращении
+    """
+    key = (doc_hash or document_hash(document), chunk_size)
+    index = cache_get(_INDEX_CACHE, key)
+    if index is None:
+        index = build_document_index(document, chunk_size)
+        # Документы больше бюджета не кэшируем: они вытеснили бы все остальные
+        if index.text_length <= _INDEX_CACHE_BUDGET:
+            cache_put(_INDEX_CACHE, key, index, _INDEX_CACHE_SIZE,
+                      size_of=lambda item: item.text_length, budget=_INDEX_CACHE_BUDGET)
+    return index
+
+
+def perform_rag_search(query: str, document: str, chunk_size: int = 200,
+                       top_k: int = 5, doc_hash: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Выполняет RAG поиск по документу (ранжирование чанков по BM25)
+    Returns: топ-k релевантных чанков и общее число найденных
+    """
+    index = get_document_index(document, chunk_size, doc_hash)
+    
     query_lower = query.lower()
-    query_words = set(re.findall(r'\b\w+\b', query_lower))
+    query_words = frozenset(_WORD_RE.findall(query_lower))
+    # Служебные слова отбрасываем, если в запросе есть что-то кроме них
+    query_words = (query_words - _STOPWORDS) or query_words
+    if not index.chunks or not query_words:
+        return [], 0
+    
+    total = len(index.chunks)
+    postings = index.postings
     
-    for i, chunk in enumerate(chunks):
-        chunk_lower = chunk.lower()
-        score = calculate_relevance_score(query_lower, chunk_lower, query_words)
+    def idf(word: str) -> float:
+        doc_freq = len(postings.get(word, ()))
+        return math.log((total - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
+    
+    # Вес термина: idf для слов запроса и половина idf для их словоформ из документа
+    query_idf = {word: idf(word) for word in query_words}
+    term_weights = dict(query_idf)
+    for term in find_partial_terms(query_words, index.long_terms):
+        term_weights[term] = 0.5 * idf(term)
+    
+    # Оцениваем только чанки, содержащие хотя бы один из терминов
+    candidates = sorted(set().union(*(postings.get(term, ()) for term in term_weights)))
+    if not candidates:
+        return [], 0
+    
+    # Скор чанка, где каждое слово запроса встречается один раз при средней длине
+    max_score = sum(query_idf.values())
+    # Бонус за точную фразу (для фраз длиннее 10 символов), вычисляется вне цикла
+    check_phrase = len(query_lower) > 10
+    phrase_bonus = 2.0 * max_score / len(query_words)
+    chunks_lower = index.chunks_lower
+    
+    # Скоры держим в словаре по номеру чанка; словари-результаты только для топ-k
+    scores: Dict[int, float] = {}
+    for i in candidates:
+        tf = index.chunk_tfs[i]
+        norm = index.chunk_norms[i]
+        score = 0.0
+        # Совпадения целых слов через пересечение множеств, без поиска подстрок
+        for term in tf.keys() & term_weights.keys():
+            freq = tf[term]
+            score += term_weights[term] * freq * (_BM25_K1 + 1) / (freq + norm)
+        
+        # Проверяем точные фразы
+        if check_phrase and query_lower in chunks_lower[i]:
+            score += phrase_bonus
         
         if score > 0:  # Только релевантные чанки
-            scored_chunks.append({
-                'text': chunk,
-                'relevance': score,
-                'chunk_id': i,
-                'length': len(chunk)
-            })
+            scores[i] = score
+    
+    # Отбираем топ-k без полной сортировки
+    top_ids = heapq.nlargest(top_k, scores, key=scores.__getitem__)
+    top_chunks = [
+        {
+            'text': index.chunks[i],
+            'relevance': min(scores[i] / max_score, 1.0),
+            'chunk_id': i,
+            'length': len(index.chunks[i])
+        }
+        for i in top_ids
+    ]
     
-    # Сортируем по релевантности
-    scored_chunks.sort(key=lambda x: x['relevance'], reverse=True)
+    return top_chunks, len(scores)
+
+
+def find_partial_terms(query_words: FrozenSet[str], long_terms: Iterable[str]) -> Set[str]:
+    """
+    Находит среди слов документа (от 4 букв) словоформы длинных слов запроса
+    (одно слово содержит другое), один проход по словарю на запрос
+    """
+    long_words = [word for word in query_words if len(word) > 4]
+    if not long_words:
+        return set()
     
-    return scored_chunks
+    partial_terms = set()
+    for term in long_terms:
+        if term in query_words:
+            continue
+        for word in long_words:
+            if word in term or term in word:
+                partial_terms.add(term)
+                break
+    return partial_terms
 
 
 def create_chunks(text: str, chunk_size: int = 200) -> List[str]:
@@ -162,74 +452,36 @@ def create_chunks(text: str, chunk_size: int = 200) -> List[str]:
     Разбивает текст на чанки с учетом предложений
     """
     # Разбиваем на предложения
-    sentences = re.split(r'[.!?]+', text)
+    sentences = _SENTENCE_RE.findall(text)
     chunks = []
-    current_chunk = ""
+    # Предложения текущего чанка и его длина с разделителями ". "
+    parts: List[str] = []
+    length = 0
     
     for sentence in sentences:
-        sentence = sentence.strip()
-        if not sentence:
-            continue
-            
         # Если добавление предложения не превышает лимит
-        if len(current_chunk + sentence) <= chunk_size:
-            current_chunk += sentence + ". "
+        if length + len(sentence) <= chunk_size:
+            parts.append(sentence)
+            length += len(sentence) + 2
         else:
             # Сохраняем текущий чанк и начинаем новый
-            if current_chunk:
-                chunks.append(current_chunk.strip())
-            current_chunk = sentence + ". "
+            if parts:
+                chunks.append(". ".join(parts) + ".")
+            parts = [sentence]
+            length = len(sentence) + 2
     
     # Добавляем последний чанк
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    if parts:
+        chunks.append(". ".join(parts) + ".")
     
     return chunks
 
 
-def calculate_relevance_score(query: str, chunk: str, query_words: set) -> float:
-    """
-    Вычисляет релевантность чанка запросу
-    """
-    chunk_words = set(re.findall(r'\b\w+\b', chunk))
-    
-    # Точные совпадения слов
-    exact_matches = len(query_words.intersection(chunk_words))
-    
-    # Частичные совпадения (для длинных слов)
-    partial_score = 0
-    for query_word in query_words:
-        if len(query_word) > 4:  # Только для длинных слов
-            for chunk_word in chunk_words:
-                if query_word in chunk_word or chunk_word in query_word:
-                    partial_score += 0.5
-    
-    # Проверяем точные фразы
-    phrase_score = 0
-    if len(query) > 10:  # Для фраз длиннее 10 символов
-        if query in chunk:
-            phrase_score = 2.0
-    
-    # Итоговый скор
-    total_score = exact_matches + partial_score + phrase_score
-    
-    # Нормализуем относительно длины запроса
-    if len(query_words) > 0:
-        total_score = total_score / len(query_words)
-    
-    return min(total_score, 1.0)  # Ограничиваем максимум единицей
-
-
-def call_openai_api(api_key: str, system_prompt: str, user_prompt: str) -> str:
+def call_openai_api(system_prompt: str, user_prompt: str) -> str:
     """
-    Вызывает OpenAI API через HTTP запрос
+    Вызывает OpenAI API через HTTP запрос (авторизация задана на общей сессии)
     """
     try:
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
         data = {
             'model': 'gpt-3.5-turbo',
             'messages': [
@@ -240,9 +492,8 @@ def call_openai_api(api_key: str, system_prompt: str, user_prompt: str) -> str:
             'temperature': 0.3
         }
         
-        response = requests.post(
+        response = _SESSION.post(
             'https://api.openai.com/v1/chat/completions',
-            headers=headers,
             json=data,
             timeout=30
         )
@@ -266,32 +517,26 @@ def call_openai_api(api_key: str, system_prompt: str, user_prompt: str) -> str:
         return f"Неожиданная ошибка OpenAI API: {str(e)}"
 
 
-def generate_fallback_answer(chunks: List[Dict[str, Any]], query: str) -> str:
+def generate_fallback_answer(chunks: List[Dict[str, Any]], query: str, chunks_found: int) -> str:
     """
     Генерирует ответ на основе найденных фрагментов без OpenAI
     """
     if not chunks:
         return f"К сожалению, я не нашел информации по вашему вопросу '{query}' в загруженном документе. Попробуйте переформулировать вопрос или использовать другие ключевые слова."
     
-    # Берем топ-3 самых релевантных фрагмента
-    top_chunks = chunks[:3]
-    
-    # Формируем ответ
-    answer_parts = []
-    answer_parts.append("🔍 **Найдена информация по вашему запросу:**\n")
-    
-    for i, chunk in enumerate(top_chunks, 1):
-        # Ограничиваем длину фрагмента
-        text = chunk['text']
-        if len(text) > 300:
-            text = text[:300] + "..."
-        
-        relevance = chunk['relevance']
-        relevance_emoji = "🎯" if relevance > 0.7 else "📝" if relevance > 0.4 else "📄"
-        
-        answer_parts.append(f"{relevance_emoji} **Фрагмент {i}** (релевантность: {relevance:.0%}):")
-        answer_parts.append(f"{text}\n")
+    # Берем топ-3 самых релевантных фрагмента, длинные обрезаем до 300 символов
+    fragments = "\n".join(
+        f"{relevance_emoji(chunk['relevance'])} **Фрагмент {i}** (релевантность: {chunk['relevance']:.0%}):\n"
+        f"{chunk['text'][:300] + '...' if len(chunk['text']) > 300 else chunk['text']}\n"
+        for i, chunk in enumerate(chunks[:3], 1)
+    )
     
-    answer_parts.append(f"📊 Найдено {len(chunks)} релевантных фрагментов в документе.")
-    
-    return "\n".join(answer_parts)
\ No newline at end of file
+    return (f"🔍 **Найдена информация по вашему запросу:**\n\n{fragments}\n"
+            f"📊 Найдено {chunks_found} релевантных фрагментов в документе.")
+
+
+def relevance_emoji(relevance: float) -> str:
+    """
+    Возвращает значок уровня релевантности фрагмента
+    """
+    return "🎯" if relevance > 0.7 else "📝" if relevance > 0.4 else "📄"
\ No newline at end of file
@@ -1,11 +1,18 @@
-import json
 import os
 import base64
+import json
+import orjson
 from typing import Dict, Any
-import PyPDF2
-import docx
 from io import BytesIO
 
+# Кодировки-кандидаты для TXT не в UTF-8: ограничиваем детектор, иначе на коротких
+# русских текстах он путает cp1251 с восточноазиатскими кодировками
+_TXT_ENCODINGS = ['cp1251', 'koi8_r', 'cp866', 'utf_16', 'latin_1']
+
+# Максимальный размер файла и длина его base64-представления (4 символа на 3 байта)
+_MAX_FILE_SIZE = 50 * 1024 * 1024
+_MAX_FILE_SIZE_B64 = 4 * ((_MAX_FILE_SIZE + 2) // 3)
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Business: Обрабатывает загрузку и извлечение текста из PDF, Word и TXT файлов
@@ -32,12 +39,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         return {
             'statusCode': 405,
             'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Method not allowed'})
+            'body': orjson.dumps({'error': 'Method not allowed'}).decode()
         }
     
     try:
         # Парсим данные запроса
-        body_data = json.loads(event.get('body', '{}'))
+        body_data = parse_json(event.get('body') or '{}')
         file_data_b64 = body_data.get('file_data', '')
         file_name = body_data.get('file_name', '')
         file_type = body_data.get('file_type', '')
@@ -46,25 +53,41 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 400,
                 'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'File data and name are required'})
+                'body': orjson.dumps({'error': 'File data and name are required'}).decode()
+            }
+        
+        # Данные файла должны быть строкой base64
+        if not isinstance(file_data_b64, str):
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': orjson.dumps({'error': 'Invalid base64 file data'}).decode()
+            }
+        
+        # Отсекаем слишком большие файлы по длине base64 еще до декодирования
+        if len(file_data_b64) > _MAX_FILE_SIZE_B64:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': orjson.dumps({'error': 'File too large. Maximum size: 50MB'}).decode()
             }
         
-        # Декодируем base64 данные
+        # Декодируем base64 данные (посторонние символы сразу дают ошибку)
         try:
-            file_data = base64.b64decode(file_data_b64)
+            file_data = base64.b64decode(file_data_b64, validate=True)
         except Exception as e:
             return {
                 'statusCode': 400,
                 'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Invalid base64 file data'})
+                'body': orjson.dumps({'error': 'Invalid base64 file data'}).decode()
             }
         
-        # Проверяем размер файла (максимум 50MB)
-        if len(file_data) > 50 * 1024 * 1024:
+        # Проверяем точный размер файла (максимум 50MB)
+        if len(file_data) > _MAX_FILE_SIZE:
             return {
                 'statusCode': 400,
                 'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'File too large. Maximum size: 50MB'})
+                'body': orjson.dumps({'error': 'File too large. Maximum size: 50MB'}).decode()
             }
         
         # Извлекаем текст в зависимости от типа файла
@@ -80,14 +103,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 400,
                 'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'Unsupported file type. Supported: PDF, DOC, DOCX, TXT'})
+                'body': orjson.dumps({'error': 'Unsupported file type. Supported: PDF, DOC, DOCX, TXT'}).decode()
             }
         
         if not extracted_text.strip():
             return {
                 'statusCode': 400,
                 'headers': {'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'error': 'No text could be extracted from the file'})
+                'body': orjson.dumps({'error': 'No text could be extracted from the file'}).decode()
             }
         
         # Формируем ответ
@@ -105,61 +128,98 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps(result, ensure_ascii=False)
+            'body': dump_json(result)
         }
         
     except json.JSONDecodeError:
         return {
             'statusCode': 400,
             'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Invalid JSON in request body'})
+            'body': orjson.dumps({'error': 'Invalid JSON in request body'}).decode()
         }
     except Exception as e:
         print(f"Error processing document: {str(e)}")
         return {
             'statusCode': 500,
             'headers': {'Access-Control-Allow-Origin': '*'},
-            'body': json.dumps({'error': 'Internal server error'})
+            'body': orjson.dumps({'error': 'Internal server error'}).decode()
         }
 
 
+def parse_json(raw: str) -> Any:
+    """
+    Разбирает JSON через orjson; строки с одиночными суррогатами (\\ud800 из
+    обрезанных эмодзи) orjson отвергает, их разбирает стандартный json
+    """
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return json.loads(raw)
+
+
+def dump_json(value: Any) -> str:
+    """
+    Сериализует ответ через orjson, а при одиночных суррогатах в строках -
+    стандартным json с экранированием
+    """
+    try:
+        return orjson.dumps(value).decode()
+    except orjson.JSONEncodeError:
+        return json.dumps(value)
+
+
 def extract_text_from_pdf(file_data: bytes) -> str:
-    """Извлекает текст из PDF файла"""
+    """Извлекает текст из PDF файла (PDFium)"""
+    # Тяжелые библиотеки импортируются при первом файле своего типа, а не при холодном старте
+    import pypdfium2 as pdfium
+    
     try:
-        file_stream = BytesIO(file_data)
-        pdf_reader = PyPDF2.PdfReader(file_stream)
-        
-        text = ""
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
+        pdf = pdfium.PdfDocument(file_data)
         
-        return text.strip()
+        # Собираем страницы в список и склеиваем один раз
+        pages = []
+        try:
+            for page in pdf:
+                textpage = page.get_textpage()
+                page_text = textpage.get_text_bounded()
+                textpage.close()
+                page.close()
+                if page_text:
+                    # PDFium разделяет строки через \r\n, приводим к \n как у остального текста
+                    pages.append(page_text.replace('\r\n', '\n').replace('\r', '\n'))
+        finally:
+            pdf.close()
+        
+        return "\n".join(pages).strip()
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
 
 def extract_text_from_word(file_data: bytes) -> str:
     """Извлекает текст из Word файла (.doc, .docx)"""
+    import docx
+    
     try:
         file_stream = BytesIO(file_data)
         doc = docx.Document(file_stream)
         
-        text = ""
+        # Собираем строки в список и склеиваем один раз
+        lines = []
         for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                text += paragraph.text + "\n"
+            paragraph_text = paragraph.text
+            if paragraph_text.strip():
+                lines.append(paragraph_text + "\n")
         
         # Также извлекаем текст из таблиц
         for table in doc.tables:
             for row in table.rows:
                 for cell in row.cells:
-                    if cell.text.strip():
-                        text += cell.text + " "
-                text += "\n"
+                    cell_text = cell.text
+                    if cell_text.strip():
+                        lines.append(cell_text + " ")
+                lines.append("\n")
         
-        return text.strip()
+        return "".join(lines).strip()
     except Exception as e:
         raise Exception(f"Error extracting text from Word document: {str(e)}")
 
@@ -167,17 +227,19 @@ def extract_text_from_word(file_data: bytes) -> str:
 def extract_text_from_txt(file_data: bytes) -> str:
     """Извлекает текст из TXT файла"""
     try:
-        # Пробуем разные кодировки
-        encodings = ['utf-8', 'cp1251', 'latin1', 'ascii']
+        # Большинство файлов в UTF-8: одна строгая попытка декодирования
+        try:
+            return file_data.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            pass
         
-        for encoding in encodings:
-            try:
-                text = file_data.decode(encoding)
-                return text.strip()
-            except UnicodeDecodeError:
-                continue
+        # Иначе определяем кодировку (cp1251, koi8-r и т.д.) за один проход по байтам
+        from charset_normalizer import from_bytes
+        best = from_bytes(file_data, cp_isolation=_TXT_ENCODINGS).best()
+        if best is not None:
+            return str(best).strip()
         
-        # Если ни одна кодировка не сработала, используем errors='ignore'
+        # Если кодировку определить не удалось, используем errors='ignore'
         text = file_data.decode('utf-8', errors='ignore')
         return text.strip()
         